@@ -1,7 +1,7 @@
 import pygame
 import os
 import sys
-import copy
+import random
 
 # Initialize Pygame
 pygame.init()
@@ -37,6 +37,8 @@ def load_images():
     """
     Load all chess piece images into the 'pieces' dictionary.
     Ensure that the 'assets' folder contains all required images.
+    Must be called after the display is set up, since convert_alpha() needs
+    the display's pixel format.
     """
     pieces_types = ['wp', 'wr', 'wn', 'wb', 'wq', 'wk', 
                    'bp', 'br', 'bn', 'bb', 'bq', 'bk']
@@ -47,8 +49,9 @@ def load_images():
             pygame.quit()
             sys.exit()
         try:
-            pieces[piece] = pygame.transform.scale(
-                pygame.image.load(path),
+            # Convert to the display's pixel format so blits don't convert per pixel
+            pieces[piece] = pygame.transform.smoothscale(
+                pygame.image.load(path).convert_alpha(),
                 (SQUARE_SIZE, SQUARE_SIZE)
             )
             print(f"Loaded image for {piece}")
@@ -57,7 +60,249 @@ def load_images():
             pygame.quit()
             sys.exit()
 
+# Bitboards
+# Squares are numbered row * 8 + col, so bit 0 is the top-left square (a8)
+# and bit 63 is the bottom-right square (h1).
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+PIECE_TYPES = {'p': PAWN, 'n': KNIGHT, 'b': BISHOP, 'r': ROOK, 'q': QUEEN, 'k': KING}
+WHITE_SIDE, BLACK_SIDE = 0, 1  # Piece colors; the opponent of 'color' is color ^ 1
+COLOR_NAMES = ('White', 'Black')  # Indexed by color
+PIECE_LETTERS = ('P', 'N', 'B', 'R', 'Q', 'K')  # Indexed by piece type
+
+# Bitboard indices (color * 6 + piece type)
+WP, WN, WB, WR, WQ, WK, BP, BN, BB, BR, BQ, BK = range(12)
+BB_KEYS = ['wp', 'wn', 'wb', 'wr', 'wq', 'wk',
+           'bp', 'bn', 'bb', 'br', 'bq', 'bk']
+
+KNIGHT_OFFSETS = [
+    (-2, -1), (-2, 1), (-1, -2), (-1, 2),
+    (1, -2), (1, 2), (2, -1), (2, 1)
+]
+KING_OFFSETS = [
+    (-1, -1), (-1, 0), (-1, 1),
+    (0, -1),          (0, 1),
+    (1, -1),  (1, 0), (1, 1)
+]
+ROOK_DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]      # Up, Down, Left, Right
+BISHOP_DIRECTIONS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]  # Diagonals
+
+def _leaper_attacks(offsets):
+    """
+    Build a 64-entry attack table for a piece that jumps by fixed offsets.
+    
+    :param offsets: List of (row, col) offsets the piece can reach
+    :return: List of bitboards indexed by square
+    """
+    table = []
+    for sq in range(ROWS * COLS):
+        row, col = divmod(sq, COLS)
+        attacks = 0
+        for d_row, d_col in offsets:
+            r, c = row + d_row, col + d_col
+            if 0 <= r < ROWS and 0 <= c < COLS:
+                attacks |= 1 << (r * COLS + c)
+        table.append(attacks)
+    return table
+
+def _ray_table(d_row, d_col):
+    """
+    Build a 64-entry table of the squares a slider sees from each square
+    along one direction on an empty board.
+    
+    :param d_row: Row step of the direction
+    :param d_col: Column step of the direction
+    :return: List of bitboards indexed by square
+    """
+    table = []
+    for sq in range(ROWS * COLS):
+        row, col = divmod(sq, COLS)
+        ray = 0
+        r, c = row + d_row, col + d_col
+        while 0 <= r < ROWS and 0 <= c < COLS:
+            ray |= 1 << (r * COLS + c)
+            r += d_row
+            c += d_col
+        table.append(ray)
+    return table
+
+# File and rank masks for set-wise pawn and knight moves
+ALL_SQUARES = 0xFFFFFFFFFFFFFFFF
+FILE_A = 0x0101010101010101
+FILE_H = FILE_A << 7
+NOT_FILE_A = FILE_A ^ ALL_SQUARES
+NOT_FILE_H = FILE_H ^ ALL_SQUARES
+NOT_FILE_AB = (FILE_A | FILE_A << 1) ^ ALL_SQUARES
+NOT_FILE_GH = (FILE_H | FILE_H >> 1) ^ ALL_SQUARES
+RANK_3 = 0xFF << 40  # Row 5: where white pawns land after a push from their start row
+RANK_6 = 0xFF << 16  # Row 2: the same for black
+
+# (row, col) of each square index
+SQUARE_POS = [divmod(sq, COLS) for sq in range(ROWS * COLS)]
+
+KNIGHT_ATTACKS = _leaper_attacks(KNIGHT_OFFSETS)
+KING_ATTACKS = _leaper_attacks(KING_OFFSETS)
+# Squares attacked by a pawn of the given color standing on each square
+PAWN_ATTACKS = [_leaper_attacks([(-1, -1), (-1, 1)]),  # White pawns move up
+                _leaper_attacks([(1, -1), (1, 1)])]    # Black pawns move down
+PAWN_START_ROW = (6, 1)   # Row each color's pawns start on
+PAWN_DOUBLE_ROW = (4, 3)  # Row each color's pawns land on after a double step
+CASTLE_ROOK_COLS = {6: (7, 5), 2: (0, 3)}  # King's castling column: (rook from, rook to)
+
+# Zobrist keys: a random 64-bit number per bitboard index and square. XORing
+# together the keys of every piece on the board identifies the placement.
+ZOBRIST_RNG = random.Random(2024)
+ZOBRIST = [[ZOBRIST_RNG.getrandbits(64) for _ in range(ROWS * COLS)] for _ in range(12)]
+
+# is_in_check() results per color, keyed by placement hash
+CHECK_CACHE = [{}, {}]
+CHECK_CACHE_SIZE = 100000  # Entries per color before the cache is cleared
+
+# (ray table, True if the ray runs towards higher square numbers)
+ROOK_RAYS = [(_ray_table(*d), d[0] * COLS + d[1] > 0) for d in ROOK_DIRECTIONS]
+BISHOP_RAYS = [(_ray_table(*d), d[0] * COLS + d[1] > 0) for d in BISHOP_DIRECTIONS]
+
+def _slider_attacks(sq, occ, rays):
+    """
+    Get the squares a sliding piece attacks, stopping at the first blocker
+    on each ray (the blocker itself is included).
+    
+    :param sq: Square index of the slider
+    :param occ: Bitboard of all occupied squares
+    :param rays: ROOK_RAYS or BISHOP_RAYS
+    :return: Bitboard of attacked squares
+    """
+    attacks = 0
+    for table, positive in rays:
+        ray = table[sq]
+        blockers = ray & occ
+        if blockers:
+            if positive:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= table[blocker]
+        attacks |= ray
+    return attacks
+
+def _slider_tables(rays):
+    """
+    Precompute slider attacks for every square and every arrangement of
+    blockers, so a lookup is one mask and two table reads.
+    
+    Only the relevant occupancy matters: the squares on the rays, minus the
+    last square of each ray (a piece there can't block anything further).
+    Each square's table is keyed directly by the masked occupancy, which
+    does the job of the magic multiply-and-shift index in a C engine.
+    
+    :param rays: ROOK_RAYS or BISHOP_RAYS
+    :return: Tuple (masks, tables) indexed by square
+    """
+    masks = []
+    tables = []
+    for sq in range(ROWS * COLS):
+        mask = 0
+        for table, positive in rays:
+            ray = table[sq]
+            if ray:
+                last = ray.bit_length() - 1 if positive else (ray & -ray).bit_length() - 1
+                mask |= ray & ~(1 << last)
+        attacks = {}
+        # Enumerate every subset of the mask (Carry-Rippler trick)
+        subset = 0
+        while True:
+            attacks[subset] = _slider_attacks(sq, subset, rays)
+            subset = (subset - mask) & mask
+            if not subset:
+                break
+        masks.append(mask)
+        tables.append(attacks)
+    return masks, tables
+
+ROOK_MASKS, ROOK_ATTACKS = _slider_tables(ROOK_RAYS)
+BISHOP_MASKS, BISHOP_ATTACKS = _slider_tables(BISHOP_RAYS)
+
+def rook_attacks(sq, occ):
+    """
+    Get the squares a rook on 'sq' attacks given the occupancy 'occ'.
+    """
+    return ROOK_ATTACKS[sq][occ & ROOK_MASKS[sq]]
+
+def bishop_attacks(sq, occ):
+    """
+    Get the squares a bishop on 'sq' attacks given the occupancy 'occ'.
+    """
+    return BISHOP_ATTACKS[sq][occ & BISHOP_MASKS[sq]]
+
+def pawn_pushes(index, pawns, empty):
+    """
+    Get the squares every pawn in a set can push to, single and double steps
+    at once.
+    
+    :param index: 0 for white or 1 for black
+    :param pawns: Bitboard of the pawns
+    :param empty: Bitboard of empty squares
+    :return: Bitboard of push targets
+    """
+    if index == 0:
+        single = (pawns >> 8) & empty
+        return single | ((single & RANK_3) >> 8) & empty
+    single = (pawns << 8) & empty
+    return single | ((single & RANK_6) << 8) & empty
+
+def pawn_attacks(index, pawns):
+    """
+    Get the squares every pawn in a set attacks diagonally.
+    
+    :param index: 0 for white or 1 for black
+    :param pawns: Bitboard of the pawns
+    :return: Bitboard of attacked squares
+    """
+    if index == 0:
+        return ((pawns >> 9) & NOT_FILE_H) | ((pawns >> 7) & NOT_FILE_A)
+    return ((pawns << 7) & NOT_FILE_H) | ((pawns << 9) & NOT_FILE_A)
+
+def knight_attacks(knights):
+    """
+    Get the squares every knight in a set attacks.
+    
+    :param knights: Bitboard of the knights
+    :return: Bitboard of attacked squares
+    """
+    return ((((knights >> 17) | (knights << 15)) & NOT_FILE_H) |
+            (((knights >> 15) | (knights << 17)) & NOT_FILE_A) |
+            (((knights >> 10) | (knights << 6)) & NOT_FILE_GH) |
+            (((knights >> 6) | (knights << 10)) & NOT_FILE_AB))
+
+def squares(bb):
+    """
+    Iterate over the square indices set in a bitboard, lowest first.
+    
+    :param bb: Bitboard
+    :return: Generator of square indices
+    """
+    while bb:
+        lsb = bb & -bb
+        yield lsb.bit_length() - 1
+        bb ^= lsb
+
+def bitboard_to_moves(bb):
+    """
+    Convert a bitboard of target squares into a move list.
+    
+    :param bb: Bitboard of target squares
+    :return: List of tuples representing positions [(row, col), ...]
+    """
+    # Same loop as squares(), inlined: skipping the generator is measurably faster here
+    moves = []
+    while bb:
+        lsb = bb & -bb
+        moves.append(SQUARE_POS[lsb.bit_length() - 1])
+        bb ^= lsb
+    return moves
+
 class Piece:
+    __slots__ = ('name', 'kind', 'row', 'col', 'color', 'index', 'has_moved', 'cache_key', 'cached_moves')
+
     def __init__(self, name, row, col, color):
         """
         Initialize a chess piece.
@@ -65,62 +310,38 @@ class Piece:
         :param name: Single character representing the piece type ('p', 'r', 'n', 'b', 'q', 'k')
         :param row: Row position on the board (0-7)
         :param col: Column position on the board (0-7)
-        :param color: 'w' for white or 'b' for black
+        :param color: WHITE_SIDE or BLACK_SIDE
         """
         self.name = name
+        self.kind = PIECE_TYPES[name]  # PAWN to KING, for comparisons in the move code
         self.row = row
         self.col = col
         self.color = color
-        key = self.color + self.name
-        if key not in pieces:
-            print(f"Error: Piece image '{key}' not found in 'pieces' dictionary.")
-            pygame.quit()
-            sys.exit()
-        self.image = pieces[key]
+        self.index = color * 6 + self.kind  # Bitboard index
         self.has_moved = False  # For castling and pawn initial move
-
-    def __deepcopy__(self, memo):
-        """
-        Custom deepcopy method to avoid copying the pygame.Surface object.
-        
-        :param memo: Dictionary for memoization (handled by copy.deepcopy)
-        :return: A new Piece instance with the same attributes, excluding the image.
-        """
-        new_piece = Piece(self.name, self.row, self.col, self.color)
-        new_piece.has_moved = self.has_moved
-        # Reassign the image from the already loaded images
-        new_piece.image = pieces[self.color + self.name]
-        return new_piece
-
-    def draw(self, win):
-        """
-        Draw the piece on the game window.
-        
-        :param win: Pygame window surface
-        """
-        win.blit(self.image, (self.col * SQUARE_SIZE, self.row * SQUARE_SIZE))
+        self.cache_key = None  # Board hash that 'cached_moves' were generated for
+        self.cached_moves = None
 
     def get_valid_moves(self, board, en_passant_target=None):
         """
         Get all valid moves for this piece.
         
+        Knight, bishop, rook and queen moves depend only on where the pieces
+        stand, so they are cached per board hash and reused until the
+        position changes. The returned list must not be modified.
+        
         :param board: Current state of the board
         :param en_passant_target: Tuple (row, col) if en passant is possible
         :return: List of tuples representing valid move positions [(row, col), ...]
         """
-        if self.name == 'p':
+        if self.kind == PAWN:
             return self.get_pawn_moves(board, en_passant_target)
-        elif self.name == 'r':
-            return self.get_rook_moves(board)
-        elif self.name == 'n':
-            return self.get_knight_moves(board)
-        elif self.name == 'b':
-            return self.get_bishop_moves(board)
-        elif self.name == 'q':
-            return self.get_queen_moves(board)
-        elif self.name == 'k':
-            return self.get_king_moves(board)
-        return []
+        if self.kind == KING:
+            return self.get_king_moves(board)  # Castling rights aren't part of the hash
+        if self.cache_key != board.hash:
+            self.cached_moves = self.MOVE_FUNCTIONS[self.kind](self, board)
+            self.cache_key = board.hash
+        return self.cached_moves
 
     def get_pawn_moves(self, board, en_passant_target=None):
         """
@@ -130,40 +351,15 @@ class Piece:
         :param en_passant_target: Tuple (row, col) if en passant is possible
         :return: List of tuples representing valid move positions [(row, col), ...]
         """
-        moves = []
-        direction = -1 if self.color == 'w' else 1
-        start_row = 6 if self.color == 'w' else 1
-
-        # Move forward one square
-        new_row = self.row + direction
-        if 0 <= new_row < ROWS and board[new_row][self.col] == 0:
-            moves.append((new_row, self.col))
-            # Move forward two squares from starting position
-            new_row_two = new_row + direction
-            if self.row == start_row and 0 <= new_row_two < ROWS and board[new_row_two][self.col] == 0:
-                moves.append((new_row_two, self.col))
-
-        # Capture diagonally to the left
-        new_col = self.col - 1
-        if 0 <= new_col < COLS and 0 <= new_row < ROWS:
-            target = board[new_row][new_col]
-            if target != 0 and target.color != self.color:
-                moves.append((new_row, new_col))
-            # En passant
-            if en_passant_target == (new_row, new_col):
-                moves.append((new_row, new_col))
-
-        # Capture diagonally to the right
-        new_col = self.col + 1
-        if 0 <= new_col < COLS and 0 <= new_row < ROWS:
-            target = board[new_row][new_col]
-            if target != 0 and target.color != self.color:
-                moves.append((new_row, new_col))
-            # En passant
-            if en_passant_target == (new_row, new_col):
-                moves.append((new_row, new_col))
+        index = self.color
+        pawn = 1 << (self.row * 8 + self.col)
+        enemy = board.occ_w if index else board.occ_b
+        # En passant
+        if en_passant_target:
+            enemy |= 1 << (en_passant_target[0] * 8 + en_passant_target[1])
 
-        return moves
+        targets = pawn_pushes(index, pawn, ~board.occ) | (pawn_attacks(index, pawn) & enemy)
+        return bitboard_to_moves(targets)
 
     def get_rook_moves(self, board):
         """
@@ -172,22 +368,8 @@ class Piece:
         :param board: Current state of the board
         :return: List of tuples representing valid move positions [(row, col), ...]
         """
-        moves = []
-        directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]  # Up, Down, Left, Right
-
-        for d in directions:
-            row, col = self.row + d[0], self.col + d[1]
-            while 0 <= row < ROWS and 0 <= col < COLS:
-                if board[row][col] == 0:
-                    moves.append((row, col))
-                else:
-                    if board[row][col].color != self.color:
-                        moves.append((row, col))
-                    break
-                row += d[0]
-                col += d[1]
-
-        return moves
+        sq = self.row * 8 + self.col
+        return bitboard_to_moves(rook_attacks(sq, board.occ) & ~board.occupancy(self.color))
 
     def get_knight_moves(self, board):
         """
@@ -196,21 +378,8 @@ class Piece:
         :param board: Current state of the board
         :return: List of tuples representing valid move positions [(row, col), ...]
         """
-        moves = []
-        move_offsets = [
-            (-2, -1), (-2, 1), (-1, -2), (-1, 2),
-            (1, -2), (1, 2), (2, -1), (2, 1)
-        ]
-
-        for offset in move_offsets:
-            row = self.row + offset[0]
-            col = self.col + offset[1]
-            if 0 <= row < ROWS and 0 <= col < COLS:
-                target = board[row][col]
-                if target == 0 or target.color != self.color:
-                    moves.append((row, col))
-
-        return moves
+        sq = self.row * 8 + self.col
+        return bitboard_to_moves(KNIGHT_ATTACKS[sq] & ~board.occupancy(self.color))
 
     def get_bishop_moves(self, board):
         """
@@ -219,22 +388,8 @@ class Piece:
         :param board: Current state of the board
         :return: List of tuples representing valid move positions [(row, col), ...]
         """
-        moves = []
-        directions = [(-1, -1), (-1, 1), (1, -1), (1, 1)]  # Diagonals
-
-        for d in directions:
-            row, col = self.row + d[0], self.col + d[1]
-            while 0 <= row < ROWS and 0 <= col < COLS:
-                if board[row][col] == 0:
-                    moves.append((row, col))
-                else:
-                    if board[row][col].color != self.color:
-                        moves.append((row, col))
-                    break
-                row += d[0]
-                col += d[1]
-
-        return moves
+        sq = self.row * 8 + self.col
+        return bitboard_to_moves(bishop_attacks(sq, board.occ) & ~board.occupancy(self.color))
 
     def get_queen_moves(self, board):
         """
@@ -244,7 +399,10 @@ class Piece:
         :return: List of tuples representing valid move positions [(row, col), ...]
         """
         # Queen's moves are combination of rook and bishop
-        return self.get_rook_moves(board) + self.get_bishop_moves(board)
+        sq = self.row * 8 + self.col
+        occ = board.occ
+        attacks = rook_attacks(sq, occ) | bishop_attacks(sq, occ)
+        return bitboard_to_moves(attacks & ~board.occupancy(self.color))
 
     def get_king_moves(self, board):
         """
@@ -253,257 +411,531 @@ class Piece:
         :param board: Current state of the board
         :return: List of tuples representing valid move positions [(row, col), ...]
         """
-        moves = []
-        directions = [
-            (-1, -1), (-1, 0), (-1, 1),
-            (0, -1),          (0, 1),
-            (1, -1),  (1, 0), (1, 1)
-        ]
-
-        for d in directions:
-            row = self.row + d[0]
-            col = self.col + d[1]
-            if 0 <= row < ROWS and 0 <= col < COLS:
-                target = board[row][col]
-                if target == 0 or target.color != self.color:
-                    # Temporarily move the king to the new square
-                    original_row, original_col = self.row, self.col
-                    self.row, self.col = row, col
-                    in_check = is_in_check(board, self.color)
-                    self.row, self.col = original_row, original_col
-                    if not in_check:
-                        moves.append((row, col))
+        sq = self.row * 8 + self.col
+        opp_attacks = attacked_squares(board, self.color ^ 1)
+        moves = bitboard_to_moves(KING_ATTACKS[sq] & ~board.occupancy(self.color) & ~opp_attacks)
 
         # Castling
-        if not self.has_moved and not is_in_check(board, self.color):
+        if not self.has_moved and not opp_attacks >> sq & 1:
             # Kingside Castling
-            if can_castle_kingside(board, self.color):
+            if can_castle_kingside(board, self.color, opp_attacks):
                 moves.append((self.row, self.col + 2))
             # Queenside Castling
-            if can_castle_queenside(board, self.color):
+            if can_castle_queenside(board, self.color, opp_attacks):
                 moves.append((self.row, self.col - 2))
 
         return moves
 
-def can_castle_kingside(board, color):
+    # Move generator for each piece type, indexed like PIECE_TYPES
+    MOVE_FUNCTIONS = (get_pawn_moves, get_knight_moves, get_bishop_moves,
+                      get_rook_moves, get_queen_moves, get_king_moves)
+
+class BoardState:
+    __slots__ = ('grid', 'bb', 'occ_w', 'occ_b', 'hash', 'attacks')
+
+    def __init__(self):
+        """
+        Initialize an empty board.
+        
+        The board keeps the Piece on each square in 'grid', a flat list indexed
+        by square (board[row * COLS + col]) like the bitboards, alongside one
+        bitboard per piece type and color in 'bb', the aggregate occupancy
+        of each side in 'occ_w' and 'occ_b', and the Zobrist hash of the
+        piece placement in 'hash'.
+        """
+        self.grid = [0] * (ROWS * COLS)
+        self.bb = [0] * 12
+        self.occ_w = 0
+        self.occ_b = 0
+        self.hash = 0
+        self.attacks = [None, None]  # attacked_squares() per color, reset on every change
+
+    def __getitem__(self, sq):
+        return self.grid[sq]
+
+    def __iter__(self):
+        return iter(self.grid)
+
+    @property
+    def occ(self):
+        """
+        Bitboard of every occupied square.
+        """
+        return self.occ_w | self.occ_b
+
+    def occupancy(self, color):
+        """
+        Get the bitboard of squares occupied by one side.
+        
+        :param color: WHITE_SIDE or BLACK_SIDE
+        :return: Bitboard of that side's pieces
+        """
+        return self.occ_b if color else self.occ_w
+
+    def place_piece(self, piece):
+        """
+        Put a piece on the (empty) square given by its row and col.
+        
+        :param piece: Piece to place
+        """
+        sq = piece.row * COLS + piece.col
+        self.grid[sq] = piece
+        self.attacks = [None, None]
+        self.hash ^= ZOBRIST[piece.index][sq]
+        bit = 1 << sq
+        self.bb[piece.index] |= bit
+        if piece.color == WHITE_SIDE:
+            self.occ_w |= bit
+        else:
+            self.occ_b |= bit
+
+    def remove_piece(self, row, col):
+        """
+        Remove whatever stands on a square.
+        
+        :param row: Row of the square
+        :param col: Column of the square
+        :return: The removed Piece, or 0 if the square was empty
+        """
+        sq = row * COLS + col
+        piece = self.grid[sq]
+        if piece:
+            self.grid[sq] = 0
+            self.attacks = [None, None]
+            self.hash ^= ZOBRIST[piece.index][sq]
+            mask = ~(1 << sq)
+            self.bb[piece.index] &= mask
+            if piece.color == WHITE_SIDE:
+                self.occ_w &= mask
+            else:
+                self.occ_b &= mask
+        return piece
+
+    def move_piece(self, piece, row, col):
+        """
+        Move a piece to a square, capturing whatever stands there.
+        
+        :param piece: Piece to move
+        :param row: Destination row
+        :param col: Destination column
+        :return: The captured Piece, or 0 if the square was empty
+        """
+        captured_piece = self.remove_piece(row, col)
+        self.remove_piece(piece.row, piece.col)
+        piece.row, piece.col = row, col
+        self.place_piece(piece)
+        return captured_piece
+
+def make_move(board, piece, move):
+    """
+    Make a move on the board in place, including the rook's move when
+    castling and the captured pawn's removal when capturing en passant.
+    
+    :param board: Current state of the board
+    :param piece: Piece being moved
+    :param move: Tuple (row, col) indicating the move
+    :return: Undo information to pass to unmake_move
+    """
+    from_row, from_col = piece.row, piece.col
+    row, col = move
+    has_moved = piece.has_moved
+    captured_piece = board.move_piece(piece, row, col)
+    # En passant: a pawn moving diagonally onto an empty square
+    if piece.kind == PAWN and not captured_piece and col != from_col:
+        captured_piece = board.remove_piece(from_row, col)
+    rook_undo = None
+    # Castling: the king leaves its start column for one two files away
+    if piece.kind == KING and from_col == 4 and col in CASTLE_ROOK_COLS:
+        rook_undo = castle_rook(board, row, col)
+    piece.has_moved = True
+    return from_row, from_col, captured_piece, has_moved, rook_undo
+
+def castle_rook(board, row, col):
+    """
+    Move the rook across the king once the king has castled.
+    
+    :param board: Current state of the board
+    :param row: Row the king castled on
+    :param col: Column the king castled to (2 or 6)
+    :return: Tuple (rook, rook_from, had_moved) for unmake_move to put the rook back
+    """
+    rook_from, rook_to = CASTLE_ROOK_COLS[col]
+    rook = board[row * COLS + rook_from]
+    rook_undo = (rook, rook_from, rook.has_moved)
+    board.move_piece(rook, row, rook_to)
+    rook.has_moved = True
+    return rook_undo
+
+def unmake_move(board, piece, undo_info):
+    """
+    Take back a move made with make_move.
+    
+    :param board: Current state of the board
+    :param piece: Piece that was moved
+    :param undo_info: Value returned by make_move
+    """
+    from_row, from_col, captured_piece, has_moved, rook_undo = undo_info
+    if rook_undo:
+        rook, rook_from, rook_has_moved = rook_undo
+        board.move_piece(rook, rook.row, rook_from)
+        rook.has_moved = rook_has_moved
+    board.move_piece(piece, from_row, from_col)
+    piece.has_moved = has_moved
+    if captured_piece:
+        board.place_piece(captured_piece)
+
+def can_castle_kingside(board, color, opp_attacks):
     """
     Check if the player can perform kingside castling.
     
     :param board: Current state of the board
-    :param color: 'w' or 'b'
+    :param color: WHITE_SIDE or BLACK_SIDE
+    :param opp_attacks: Bitboard of squares the opponent attacks
     :return: Boolean indicating if kingside castling is possible
     """
-    row = 7 if color == 'w' else 0
-    king = board[row][4]
-    rook = board[row][7]
-    if rook == 0 or rook.name != 'r' or rook.color != color or rook.has_moved:
+    row = 7 if color == WHITE_SIDE else 0
+    rook_sq = row * COLS + 7
+    if not board.bb[color * 6 + ROOK] >> rook_sq & 1 or board[rook_sq].has_moved:
         return False
     # Check squares between king and rook
-    for col in range(5, 7):
-        if board[row][col] != 0:
-            return False
+    if board.occ & (0b01100000 << (row * 8)):
+        return False
     # Check if squares king passes through are under attack
-    for col in range(4, 7):
-        if is_square_under_attack(board, (row, col), color):
-            return False
+    if opp_attacks & (0b01110000 << (row * 8)):
+        return False
     return True
 
-def can_castle_queenside(board, color):
+def can_castle_queenside(board, color, opp_attacks):
     """
     Check if the player can perform queenside castling.
     
     :param board: Current state of the board
-    :param color: 'w' or 'b'
+    :param color: WHITE_SIDE or BLACK_SIDE
+    :param opp_attacks: Bitboard of squares the opponent attacks
     :return: Boolean indicating if queenside castling is possible
     """
-    row = 7 if color == 'w' else 0
-    king = board[row][4]
-    rook = board[row][0]
-    if rook == 0 or rook.name != 'r' or rook.color != color or rook.has_moved:
+    row = 7 if color == WHITE_SIDE else 0
+    rook_sq = row * COLS
+    if not board.bb[color * 6 + ROOK] >> rook_sq & 1 or board[rook_sq].has_moved:
         return False
     # Check squares between king and rook
-    for col in range(1, 4):
-        if board[row][col] != 0:
-            return False
+    if board.occ & (0b00001110 << (row * 8)):
+        return False
     # Check if squares king passes through are under attack
-    for col in range(2, 5):
-        if is_square_under_attack(board, (row, col), color):
-            return False
+    if opp_attacks & (0b00011100 << (row * 8)):
+        return False
     return True
 
-def is_square_under_attack(board, square, color):
+def square_attacked(bb, occ, sq, index):
     """
-    Determine if a square is under attack by the opponent.
+    Determine if the opponent of side 'index' attacks a square.
     
-    :param board: Current state of the board
-    :param square: Tuple (row, col) representing the square to check
-    :param color: 'w' or 'b' representing the current player's color
+    This is the attack-detection kernel: it takes only plain ints and the
+    bitboard list, never a Piece or BoardState, so it is the one function
+    to replace if attack detection is ever moved to native code.
+    
+    :param bb: The twelve piece bitboards
+    :param occ: Bitboard of all occupied squares
+    :param sq: Square index to check
+    :param index: WHITE_SIDE or BLACK_SIDE, the side being attacked
     :return: Boolean indicating if the square is under attack
     """
-    opponent_color = 'b' if color == 'w' else 'w'
-    for row in board:
-        for piece in row:
-            if piece != 0 and piece.color == opponent_color:
-                # **Important Fix:** Skip opponent's king to prevent recursion
-                if piece.name == 'k':
-                    continue
-                moves = piece.get_valid_moves(board)
-                if square in moves:
-                    return True
-    return False
-
-def draw_board(win):
+    # Look outwards from the square for each kind of attacker, cheapest test first
+    opp = 6 - 6 * index  # Offset of the opponent's bitboards
+    if PAWN_ATTACKS[index][sq] & bb[opp + PAWN]:
+        return True
+    if KNIGHT_ATTACKS[sq] & bb[opp + KNIGHT]:
+        return True
+    # Slider lookups are inlined rather than going through rook_attacks()/bishop_attacks()
+    if ROOK_ATTACKS[sq][occ & ROOK_MASKS[sq]] & (bb[opp + ROOK] | bb[opp + QUEEN]):
+        return True
+    if BISHOP_ATTACKS[sq][occ & BISHOP_MASKS[sq]] & (bb[opp + BISHOP] | bb[opp + QUEEN]):
+        return True
+    return bool(KING_ATTACKS[sq] & bb[opp + KING])
+
+def attacked_squares(board, color):
     """
-    Draw the chessboard on the window, including the border.
+    Get every square attacked by the pieces of one color. The result is
+    cached on the board until the position changes.
     
-    :param win: Pygame window surface
+    Sliders look through the enemy king, so the squares behind it on a
+    checking ray count as attacked and the king can't step back along it.
+    
+    :param board: Current state of the board
+    :param color: WHITE_SIDE or BLACK_SIDE for the attacking side
+    :return: Bitboard of attacked squares
+    """
+    attacks = board.attacks[color]
+    if attacks is None:
+        bb = board.bb
+        own = 6 * color
+        occ = board.occ & ~bb[6 * (1 - color) + KING]
+        attacks = pawn_attacks(color, bb[own + PAWN]) | knight_attacks(bb[own + KNIGHT])
+        for sq in squares(bb[own + BISHOP] | bb[own + QUEEN]):
+            attacks |= bishop_attacks(sq, occ)
+        for sq in squares(bb[own + ROOK] | bb[own + QUEEN]):
+            attacks |= rook_attacks(sq, occ)
+        king_bb = bb[own + KING]
+        if king_bb:  # The king square is the bitboard's only bit
+            attacks |= KING_ATTACKS[king_bb.bit_length() - 1]
+        board.attacks[color] = attacks
+    return attacks
+
+def render_board_background():
+    """
+    Render the chessboard squares and border once onto their own surface.
+    
+    :return: Pygame surface of the empty board
     """
+    background = pygame.Surface((BOARD_SIZE, BOARD_SIZE)).convert()
     colors = [WHITE, BLACK]
     for row in range(ROWS):
         for col in range(COLS):
             color = colors[(row + col) % 2]
-            pygame.draw.rect(win, color, (col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+            pygame.draw.rect(background, color, (col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
     
     # Draw border around the chessboard
     border_color = GREY
-    pygame.draw.rect(win, border_color, (0, 0, BOARD_SIZE, BOARD_SIZE), BORDER_WIDTH)
+    pygame.draw.rect(background, border_color, (0, 0, BOARD_SIZE, BOARD_SIZE), BORDER_WIDTH)
+    return background
 
-def create_board():
+BOARD_BG = render_board_background()
+
+# Semi-transparent highlights for the selected piece and its valid moves
+HIGHLIGHT_SELECTED = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
+HIGHLIGHT_SELECTED.fill((0, 0, 255, 100))  # Semi-transparent blue
+HIGHLIGHT_MOVE = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
+HIGHLIGHT_MOVE.fill((0, 255, 0, 100))  # Semi-transparent green
+
+def draw_board(win):
     """
-    Create the initial chessboard setup with all pieces in their starting positions.
+    Draw the chessboard on the window, including the border.
     
-    :return: 2D list representing the board with Piece instances or 0 for empty squares
+    :param win: Pygame window surface
+    """
+    win.blit(BOARD_BG, (0, 0))
+
+def draw_squares(win, dirty):
     """
-    board = [[0 for _ in range(COLS)] for _ in range(ROWS)]
+    Redraw the empty board under a set of squares.
     
-    # Place Black Pieces
-    board[0][0] = Piece('r', 0, 0, 'b')
-    board[0][1] = Piece('n', 0, 1, 'b')
-    board[0][2] = Piece('b', 0, 2, 'b')
-    board[0][3] = Piece('q', 0, 3, 'b')
-    board[0][4] = Piece('k', 0, 4, 'b')
-    board[0][5] = Piece('b', 0, 5, 'b')
-    board[0][6] = Piece('n', 0, 6, 'b')
-    board[0][7] = Piece('r', 0, 7, 'b')
-    for col in range(COLS):
-        board[1][col] = Piece('p', 1, col, 'b')
+    :param win: Pygame window surface
+    :param dirty: Bitboard of the squares to redraw
+    :return: List of pygame.Rect objects covering the redrawn squares
+    """
+    rects = []
+    for sq in squares(dirty):
+        row, col = SQUARE_POS[sq]
+        rect = pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+        win.blit(BOARD_BG, rect, rect)
+        rects.append(rect)
+    return rects
+
+def draw_pieces(win, board, mask=ALL_SQUARES):
+    """
+    Draw the pieces on the board by walking the piece bitboards.
     
-    # Place White Pieces
-    board[7][0] = Piece('r', 7, 0, 'w')
-    board[7][1] = Piece('n', 7, 1, 'w')
-    board[7][2] = Piece('b', 7, 2, 'w')
-    board[7][3] = Piece('q', 7, 3, 'w')
-    board[7][4] = Piece('k', 7, 4, 'w')
-    board[7][5] = Piece('b', 7, 5, 'w')
-    board[7][6] = Piece('n', 7, 6, 'w')
-    board[7][7] = Piece('r', 7, 7, 'w')
-    for col in range(COLS):
-        board[6][col] = Piece('p', 6, col, 'w')
+    :param win: Pygame window surface
+    :param board: Current state of the board
+    :param mask: Bitboard of the squares to draw pieces on
+    """
+    for index, key in enumerate(BB_KEYS):
+        image = pieces[key]
+        for sq in squares(board.bb[index] & mask):
+            row, col = SQUARE_POS[sq]
+            win.blit(image, (col * SQUARE_SIZE, row * SQUARE_SIZE))
+
+# Starting position, one bitboard per piece type and color (see BB_KEYS)
+START_POSITION = [
+    0x00FF000000000000,  # White pawns
+    0x4200000000000000,  # White knights
+    0x2400000000000000,  # White bishops
+    0x8100000000000000,  # White rooks
+    0x0800000000000000,  # White queen
+    0x1000000000000000,  # White king
+    0x000000000000FF00,  # Black pawns
+    0x0000000000000042,  # Black knights
+    0x0000000000000024,  # Black bishops
+    0x0000000000000081,  # Black rooks
+    0x0000000000000008,  # Black queen
+    0x0000000000000010,  # Black king
+]
+
+def create_board():
+    """
+    Create the initial chessboard setup with all pieces in their starting positions.
     
+    :return: BoardState with every piece in its starting position
+    """
+    board = BoardState()
+    for index, bb in enumerate(START_POSITION):
+        color, name = index // 6, BB_KEYS[index][1]
+        for sq in squares(bb):
+            row, col = divmod(sq, COLS)
+            board.place_piece(Piece(name, row, col, color))
     return board
 
 # Initialize Fonts
 FONT = pygame.font.SysFont('Arial', 24)
 WIN_FONT = pygame.font.SysFont('Arial', 36, bold=True)
 BUTTON_FONT = pygame.font.SysFont('Arial', 28, bold=True)
+PROMOTE_FONT = pygame.font.SysFont('Arial', 30)
+
+# Static sidebar labels, rendered once
+LBL_TURN = [FONT.render("Turn: White", True, BLACK_TEXT),
+            FONT.render("Turn: Black", True, BLACK_TEXT)]
+LBL_WINS = [WIN_FONT.render("White Wins!", True, RED),
+            WIN_FONT.render("Black Wins!", True, RED)]
+LBL_GAME_OVER = FONT.render("Game Over", True, RED)
+LBL_HISTORY = FONT.render("Move History:", True, BLACK_TEXT)
+LBL_CAPTURED = FONT.render("Captured Pieces:", True, BLACK_TEXT)
+LBL_WHITE = FONT.render("White:", True, BLACK_TEXT)
+LBL_BLACK = FONT.render("Black:", True, BLACK_TEXT)
+LBL_PROMOTE = PROMOTE_FONT.render("Promote to (Q/R/B/N): ", True, BLACK_TEXT)
+PROMOTE_KEYS = {pygame.K_q: 'q', pygame.K_r: 'r', pygame.K_b: 'b', pygame.K_n: 'n'}
+MOUSE_EVENTS = [pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP]
+
+# Rendered move history lines, keyed by the move string
+MOVE_SURF_CACHE = {}
+
+SIDEBAR_RECT = pygame.Rect(BOARD_SIZE, 0, SIDEBAR_WIDTH, BOARD_SIZE)
+
+# Undo button, pre-rendered in its normal and hovered states
+UNDO_BUTTON_RECT = pygame.Rect(BOARD_SIZE + (SIDEBAR_WIDTH - 200) // 2, HEIGHT - 50 - 20, 200, 50)
+
+def render_button(color, label):
+    """
+    Render a button with its label onto its own surface.
+    
+    :param color: Background color of the button
+    :param label: Pre-rendered text surface shown on the button
+    :return: Pygame surface the size of UNDO_BUTTON_RECT
+    """
+    surface = pygame.Surface(UNDO_BUTTON_RECT.size).convert()
+    surface.fill(color)
+    surface.blit(label, label.get_rect(center=surface.get_rect().center))
+    return surface
 
-def draw_sidebar(win, turn, move_history, captured_white, captured_black, game_over=False, winner=None):
+LBL_UNDO = BUTTON_FONT.render("Undo", True, WHITE_TEXT)
+BUTTON_SURF_NORMAL = render_button(BUTTON_COLOR, LBL_UNDO)
+BUTTON_SURF_HOVER = render_button(BUTTON_HOVER_COLOR, LBL_UNDO)
+
+def draw_undo_button(win):
     """
-    Draw the sidebar containing the turn indicator, move history, captured pieces, and Undo button.
+    Draw the Undo button, highlighted while the mouse is over it.
     
     :param win: Pygame window surface
-    :param turn: 'w' for White's turn or 'b' for Black's turn
-    :param move_history: List of move strings
+    :return: pygame.Rect object representing the Undo button
+    """
+    if UNDO_BUTTON_RECT.collidepoint(pygame.mouse.get_pos()):
+        win.blit(BUTTON_SURF_HOVER, UNDO_BUTTON_RECT)
+    else:
+        win.blit(BUTTON_SURF_NORMAL, UNDO_BUTTON_RECT)
+    return UNDO_BUTTON_RECT
+
+# Last rendered sidebar, without the Undo button, and the state it shows
+SIDEBAR_CACHE = {'state': None, 'surface': None}
+MAX_VISIBLE_MOVES = 15  # Move history lines shown in the sidebar
+
+def render_sidebar(turn, visible_moves, captured_white, captured_black, game_over, winner):
+    """
+    Render the turn indicator, move history and captured pieces onto their own surface.
+    
+    :param turn: WHITE_SIDE or BLACK_SIDE, whose turn it is
+    :param visible_moves: The move strings to show, oldest first
     :param captured_white: List of captured white pieces
     :param captured_black: List of captured black pieces
     :param game_over: Boolean indicating if the game has ended
-    :param winner: 'w' or 'b' indicating the winner
-    :return: pygame.Rect object representing the Undo button
+    :param winner: WHITE_SIDE or BLACK_SIDE indicating the winner
+    :return: Pygame surface the size of SIDEBAR_RECT
     """
+    surface = pygame.Surface(SIDEBAR_RECT.size).convert()
     # Draw sidebar background
     sidebar_color = LIGHT_GREY
-    pygame.draw.rect(win, sidebar_color, (BOARD_SIZE, 0, SIDEBAR_WIDTH, BOARD_SIZE))
+    surface.fill(sidebar_color)
     
     padding = 20
     current_y = padding
     
     # Display turn indicator
     if not game_over:
-        turn_text = FONT.render(f"Turn: {'White' if turn == 'w' else 'Black'}", True, BLACK_TEXT)
-        win.blit(turn_text, (BOARD_SIZE + 20, current_y))
+        surface.blit(LBL_TURN[turn], (20, current_y))
         current_y += 30
     else:
         # Display win message
-        if winner:
-            win_message = f"{'White' if winner == 'w' else 'Black'} Wins!"
-            win_text = WIN_FONT.render(win_message, True, RED)
-            text_rect = win_text.get_rect(center=(BOARD_SIZE + SIDEBAR_WIDTH//2, 50))
-            win.blit(win_text, text_rect)
+        if winner is not None:
+            win_text = LBL_WINS[winner]
+            text_rect = win_text.get_rect(center=(SIDEBAR_WIDTH//2, 50))
+            surface.blit(win_text, text_rect)
             current_y += 80
         else:
             # Draw if no winner (e.g., draw)
-            draw_text = FONT.render("Game Over", True, RED)
-            text_rect = draw_text.get_rect(center=(BOARD_SIZE + SIDEBAR_WIDTH//2, 50))
-            win.blit(draw_text, text_rect)
+            draw_text = LBL_GAME_OVER
+            text_rect = draw_text.get_rect(center=(SIDEBAR_WIDTH//2, 50))
+            surface.blit(draw_text, text_rect)
             current_y += 50
     
     # Display Move History
-    history_title = FONT.render("Move History:", True, BLACK_TEXT)
-    win.blit(history_title, (BOARD_SIZE + 20, current_y))
+    surface.blit(LBL_HISTORY, (20, current_y))
     current_y += 30
-    for i, move in enumerate(move_history[-15:]):  # Show last 15 moves
-        move_text = FONT.render(move, True, BLACK_TEXT)
-        win.blit(move_text, (BOARD_SIZE + 20, current_y))
+    for move in visible_moves:
+        move_text = MOVE_SURF_CACHE.get(move)
+        if move_text is None:
+            move_text = MOVE_SURF_CACHE[move] = FONT.render(move, True, BLACK_TEXT)
+        surface.blit(move_text, (20, current_y))
         current_y += 25
     
     current_y += 10  # Add space before captured pieces
     
     # Display Captured Pieces
-    captured_title = FONT.render("Captured Pieces:", True, BLACK_TEXT)
-    win.blit(captured_title, (BOARD_SIZE + 20, current_y))
+    surface.blit(LBL_CAPTURED, (20, current_y))
     current_y += 30
     
     # Captured White Pieces
-    white_captured_text = FONT.render("White:", True, BLACK_TEXT)
-    win.blit(white_captured_text, (BOARD_SIZE + 20, current_y))
+    surface.blit(LBL_WHITE, (20, current_y))
     current_y += 25
     for piece in captured_white:
         piece_image = pieces.get(piece, None)
         if piece_image:
-            win.blit(piece_image, (BOARD_SIZE + 20, current_y))
+            surface.blit(piece_image, (20, current_y))
             current_y += 30
     
     current_y += 10  # Add space between white and black
     
     # Captured Black Pieces
-    black_captured_text = FONT.render("Black:", True, BLACK_TEXT)
-    win.blit(black_captured_text, (BOARD_SIZE + 20, current_y))
+    surface.blit(LBL_BLACK, (20, current_y))
     current_y += 25
     for piece in captured_black:
         piece_image = pieces.get(piece, None)
         if piece_image:
-            win.blit(piece_image, (BOARD_SIZE + 20, current_y))
+            surface.blit(piece_image, (20, current_y))
             current_y += 30
+    return surface
+
+def draw_sidebar(win, turn, move_history, captured_white, captured_black, game_over=False, winner=None):
+    """
+    Draw the sidebar containing the turn indicator, move history, captured pieces, and Undo button.
+    The sidebar is only rendered again when the state it shows has changed.
     
-    # Draw Undo Button
-    button_width, button_height = 200, 50
-    button_x = BOARD_SIZE + (SIDEBAR_WIDTH - button_width) // 2
-    button_y = HEIGHT - button_height - padding
-    undo_button_rect = pygame.Rect(button_x, button_y, button_width, button_height)
-    
-    # Change button color on hover
-    mouse_pos = pygame.mouse.get_pos()
-    if undo_button_rect.collidepoint(mouse_pos):
-        pygame.draw.rect(win, BUTTON_HOVER_COLOR, undo_button_rect)
-    else:
-        pygame.draw.rect(win, BUTTON_COLOR, undo_button_rect)
-    
-    # Draw button text
-    undo_text = BUTTON_FONT.render("Undo", True, WHITE_TEXT)
-    text_rect = undo_text.get_rect(center=undo_button_rect.center)
-    win.blit(undo_text, text_rect)
+    :param win: Pygame window surface
+    :param turn: WHITE_SIDE or BLACK_SIDE, whose turn it is
+    :param move_history: List of move strings
+    :param captured_white: List of captured white pieces
+    :param captured_black: List of captured black pieces
+    :param game_over: Boolean indicating if the game has ended
+    :param winner: WHITE_SIDE or BLACK_SIDE indicating the winner
+    :return: pygame.Rect object representing the Undo button
+    """
+    # Only the last few moves are shown, so only they are copied and compared
+    visible_moves = tuple(move_history[-MAX_VISIBLE_MOVES:])
+    state = (turn, game_over, winner, visible_moves, tuple(captured_white), tuple(captured_black))
+    if state != SIDEBAR_CACHE['state']:
+        SIDEBAR_CACHE['surface'] = render_sidebar(turn, visible_moves, captured_white, captured_black, game_over, winner)
+        SIDEBAR_CACHE['state'] = state
+    win.blit(SIDEBAR_CACHE['surface'], SIDEBAR_RECT)
     
-    return undo_button_rect  # Return the button's rectangle for click detection
+    # Draw Undo Button
+    return draw_undo_button(win)  # Return the button's rectangle for click detection
 
 def get_square_under_mouse(board):
     """
@@ -529,7 +961,7 @@ def get_square_under_mouse(board):
 
     # Ensure row and col are within valid range
     if 0 <= row < ROWS and 0 <= col < COLS:
-        return board[row][col], row, col
+        return board[row * COLS + col], row, col
 
     return None, None, None
 
@@ -540,293 +972,119 @@ def check_win_condition(board):
     :param board: Current state of the board
     :return: Tuple (game_over, winner) where:
              - game_over is True if the game has ended
-             - winner is 'w' or 'b' indicating the winner, or None for no winner
-    """
-    white_king = False
-    black_king = False
-    for row in board:
-        for piece in row:
-            if piece != 0:
-                if piece.name == 'k':
-                    if piece.color == 'w':
-                        white_king = True
-                    elif piece.color == 'b':
-                        black_king = True
-    if not white_king:
-        return True, 'b'  # Black wins
-    if not black_king:
-        return True, 'w'  # White wins
+             - winner is WHITE_SIDE or BLACK_SIDE indicating the winner, or None for no winner
+    """
+    if not board.bb[WK]:
+        return True, BLACK_SIDE  # Black wins
+    if not board.bb[BK]:
+        return True, WHITE_SIDE  # White wins
     return False, None  # No winner yet
 
 def is_in_check(board, color):
     """
-    Determine if the king of the specified color is in check.
+    Determine if the king of the specified color is in check. Results are
+    remembered per piece placement in CHECK_CACHE.
     
     :param board: Current state of the board
-    :param color: 'w' or 'b'
+    :param color: WHITE_SIDE or BLACK_SIDE
     :return: Boolean indicating if the king is in check
     """
+    cache = CHECK_CACHE[color]
+    in_check = cache.get(board.hash)
+    if in_check is not None:
+        return in_check
+
+    bb = board.bb
     # Find the king's position
-    king_pos = None
-    for row in board:
-        for piece in row:
-            if piece != 0 and piece.name == 'k' and piece.color == color:
-                king_pos = (piece.row, piece.col)
-                break
-    if not king_pos:
+    king_bb = bb[color * 6 + KING]
+    if not king_bb:
         return False  # King not found, already handled in win condition
+    king_sq = king_bb.bit_length() - 1
 
-    # Check all opponent pieces to see if they can attack the king
-    opponent_color = 'b' if color == 'w' else 'w'
-    for row in board:
-        for piece in row:
-            if piece != 0 and piece.color == opponent_color:
-                # **Important Fix:** Skip opponent's king to prevent recursion
-                if piece.name == 'k':
-                    continue
-                moves = piece.get_valid_moves(board)
-                if king_pos in moves:
-                    return True
-    return False
-
-def is_checkmate(board, color):
-    """
-    Determine if the player of the specified color is in checkmate.
-    
-    :param board: Current state of the board
-    :param color: 'w' or 'b'
-    :return: Boolean indicating if the player is in checkmate
-    """
-    if not is_in_check(board, color):
-        return False
-    # Get all valid moves for the player
-    for row in board:
-        for piece in row:
-            if piece != 0 and piece.color == color:
-                moves = piece.get_valid_moves(board)
-                for move in moves:
-                    # Make a temporary copy of the board and make the move
-                    temp_board = copy.deepcopy(board)
-                    temp_piece = temp_board[piece.row][piece.col]
-                    temp_board[piece.row][piece.col] = 0
-                    captured_piece = temp_board[move[0]][move[1]]
-                    temp_board[move[0]][move[1]] = temp_piece
-                    temp_piece.row, temp_piece.col = move[0], move[1]
-                    # Handle castling moves separately
-                    if piece.name == 'k' and abs(move[1] - 4) == 2:
-                        if move[1] - 4 == 2:
-                            # Kingside Castling
-                            rook = temp_board[move[0]][7]
-                            temp_board[move[0]][7] = 0
-                            temp_board[move[0]][5] = rook
-                            rook.row, rook.col = move[0], 5
-                        elif move[1] - 4 == -2:
-                            # Queenside Castling
-                            rook = temp_board[move[0]][0]
-                            temp_board[move[0]][0] = 0
-                            temp_board[move[0]][3] = rook
-                            rook.row, rook.col = move[0], 3
-                    # Check if the king is still in check after the move
-                    if not is_in_check(temp_board, color):
-                        return False
-    return True
+    in_check = square_attacked(bb, board.occ_w | board.occ_b, king_sq, color)
+    if len(cache) >= CHECK_CACHE_SIZE:
+        cache.clear()
+    cache[board.hash] = in_check
+    return in_check
 
-def promote_pawn(screen, piece):
+def legal_moves(board, piece, targets=~0, en_passant_target=None):
     """
-    Handle pawn promotion by allowing the player to choose a piece to promote to.
-    
-    :param screen: Pygame window surface
-    :param piece: The pawn piece to be promoted
-    :return: The new promoted Piece instance
-    """
-    promotion = False
-    choice = 'q'  # Default promotion to Queen
-
-    while not promotion:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_q:
-                    choice = 'q'
-                    promotion = True
-                elif event.key == pygame.K_r:
-                    choice = 'r'
-                    promotion = True
-                elif event.key == pygame.K_b:
-                    choice = 'b'
-                    promotion = True
-                elif event.key == pygame.K_n:
-                    choice = 'n'
-                    promotion = True
-
-        # Display promotion options
-        font = pygame.font.SysFont('Arial', 30)
-        text = font.render("Promote to (Q/R/B/N): ", True, BLACK_TEXT)
-        # Clear the promotion area
-        pygame.draw.rect(screen, LIGHT_GREY, (BOARD_SIZE + 10, HEIGHT//2 - 30, SIDEBAR_WIDTH - 20, 60))
-        screen.blit(text, (BOARD_SIZE + 20, HEIGHT//2 - 30))
-        pygame.display.flip()
-    
-    return Piece(choice, piece.row, piece.col, piece.color)
-
-def move_puts_king_in_check(board, piece, move, color):
-    """
-    Determine if making a move would put the player's king in check.
+    Lazily yield the moves of a piece that don't leave its own king in check,
+    so a caller looking for any legal move can stop at the first one.
     
     :param board: Current state of the board
-    :param piece: Piece being moved
-    :param move: Tuple (row, col) indicating the move
-    :param color: 'w' or 'b'
-    :return: True if the move puts the king in check, False otherwise
+    :param piece: Piece to move
+    :param targets: Bitboard of the destination squares worth trying
+    :param en_passant_target: Tuple (row, col) if en passant is possible
+    :return: Generator of tuples (row, col)
     """
-    temp_board = copy.deepcopy(board)
-    temp_piece = temp_board[piece.row][piece.col]
-    temp_board[piece.row][piece.col] = 0
-    captured_piece = temp_board[move[0]][move[1]]
-    temp_board[move[0]][move[1]] = temp_piece
-    temp_piece.row, temp_piece.col = move[0], move[1]
-    return is_in_check(temp_board, color)
-
-def draw_sidebar(win, turn, move_history, captured_white, captured_black, game_over=False, winner=None):
-    """
-    Draw the sidebar containing the turn indicator, move history, captured pieces, and Undo button.
-    
-    :param win: Pygame window surface
-    :param turn: 'w' for White's turn or 'b' for Black's turn
-    :param move_history: List of move strings
-    :param captured_white: List of captured white pieces
-    :param captured_black: List of captured black pieces
-    :param game_over: Boolean indicating if the game has ended
-    :param winner: 'w' or 'b' indicating the winner
-    :return: pygame.Rect object representing the Undo button
-    """
-    # Draw sidebar background
-    sidebar_color = LIGHT_GREY
-    pygame.draw.rect(win, sidebar_color, (BOARD_SIZE, 0, SIDEBAR_WIDTH, BOARD_SIZE))
-    
-    padding = 20
-    current_y = padding
-    
-    # Display turn indicator
-    if not game_over:
-        turn_text = FONT.render(f"Turn: {'White' if turn == 'w' else 'Black'}", True, BLACK_TEXT)
-        win.blit(turn_text, (BOARD_SIZE + 20, current_y))
-        current_y += 30
-    else:
-        # Display win message
-        if winner:
-            win_message = f"{'White' if winner == 'w' else 'Black'} Wins!"
-            win_text = WIN_FONT.render(win_message, True, RED)
-            text_rect = win_text.get_rect(center=(BOARD_SIZE + SIDEBAR_WIDTH//2, 50))
-            win.blit(win_text, text_rect)
-            current_y += 80
-        else:
-            # Draw if no winner (e.g., draw)
-            draw_text = FONT.render("Game Over", True, RED)
-            text_rect = draw_text.get_rect(center=(BOARD_SIZE + SIDEBAR_WIDTH//2, 50))
-            win.blit(draw_text, text_rect)
-            current_y += 50
-    
-    # Display Move History
-    history_title = FONT.render("Move History:", True, BLACK_TEXT)
-    win.blit(history_title, (BOARD_SIZE + 20, current_y))
-    current_y += 30
-    for i, move in enumerate(move_history[-15:]):  # Show last 15 moves
-        move_text = FONT.render(move, True, BLACK_TEXT)
-        win.blit(move_text, (BOARD_SIZE + 20, current_y))
-        current_y += 25
-    
-    current_y += 10  # Add space before captured pieces
-    
-    # Display Captured Pieces
-    captured_title = FONT.render("Captured Pieces:", True, BLACK_TEXT)
-    win.blit(captured_title, (BOARD_SIZE + 20, current_y))
-    current_y += 30
-    
-    # Captured White Pieces
-    white_captured_text = FONT.render("White:", True, BLACK_TEXT)
-    win.blit(white_captured_text, (BOARD_SIZE + 20, current_y))
-    current_y += 25
-    for piece in captured_white:
-        piece_image = pieces.get(piece, None)
-        if piece_image:
-            win.blit(piece_image, (BOARD_SIZE + 20, current_y))
-            current_y += 30
-    
-    current_y += 10  # Add space between white and black
-    
-    # Captured Black Pieces
-    black_captured_text = FONT.render("Black:", True, BLACK_TEXT)
-    win.blit(black_captured_text, (BOARD_SIZE + 20, current_y))
-    current_y += 25
-    for piece in captured_black:
-        piece_image = pieces.get(piece, None)
-        if piece_image:
-            win.blit(piece_image, (BOARD_SIZE + 20, current_y))
-            current_y += 30
-    
-    # Draw Undo Button
-    button_width, button_height = 200, 50
-    button_x = BOARD_SIZE + (SIDEBAR_WIDTH - button_width) // 2
-    button_y = HEIGHT - button_height - padding
-    undo_button_rect = pygame.Rect(button_x, button_y, button_width, button_height)
-    
-    # Change button color on hover
-    mouse_pos = pygame.mouse.get_pos()
-    if undo_button_rect.collidepoint(mouse_pos):
-        pygame.draw.rect(win, BUTTON_HOVER_COLOR, undo_button_rect)
-    else:
-        pygame.draw.rect(win, BUTTON_COLOR, undo_button_rect)
-    
-    # Draw button text
-    undo_text = BUTTON_FONT.render("Undo", True, WHITE_TEXT)
-    text_rect = undo_text.get_rect(center=undo_button_rect.center)
-    win.blit(undo_text, text_rect)
-    
-    return undo_button_rect  # Return the button's rectangle for click detection
-
-def is_checkmate(board, color):
+    color = piece.color
+    for move in piece.get_valid_moves(board, en_passant_target):
+        if not targets >> (move[0] * 8 + move[1]) & 1:
+            continue
+        # Make the move in place and check if the king is still in check
+        undo_info = make_move(board, piece, move)
+        in_check = is_in_check(board, color)
+        unmake_move(board, piece, undo_info)
+        if not in_check:
+            yield move
+
+def is_checkmate(board, color, en_passant_target=None):
     """
     Determine if the player of the specified color is in checkmate.
     
+    Escapes are tried in the order they are most likely to exist: king moves
+    first, then (against a single checker) moves that capture the checker or
+    block its line. Pieces that cannot reach those squares are never tried.
+    
     :param board: Current state of the board
-    :param color: 'w' or 'b'
+    :param color: WHITE_SIDE or BLACK_SIDE
+    :param en_passant_target: Tuple (row, col) if en passant is possible
     :return: Boolean indicating if the player is in checkmate
     """
     if not is_in_check(board, color):
         return False
-    # Get all valid moves for the player
-    for row in board:
-        for piece in row:
-            if piece != 0 and piece.color == color:
-                moves = piece.get_valid_moves(board)
-                for move in moves:
-                    # Make a temporary copy of the board and make the move
-                    temp_board = copy.deepcopy(board)
-                    temp_piece = temp_board[piece.row][piece.col]
-                    temp_board[piece.row][piece.col] = 0
-                    captured_piece = temp_board[move[0]][move[1]]
-                    temp_board[move[0]][move[1]] = temp_piece
-                    temp_piece.row, temp_piece.col = move[0], move[1]
-                    # Handle castling moves separately
-                    if piece.name == 'k' and abs(move[1] - 4) == 2:
-                        if move[1] - 4 == 2:
-                            # Kingside Castling
-                            rook = temp_board[move[0]][7]
-                            temp_board[move[0]][7] = 0
-                            temp_board[move[0]][5] = rook
-                            rook.row, rook.col = move[0], 5
-                        elif move[1] - 4 == -2:
-                            # Queenside Castling
-                            rook = temp_board[move[0]][0]
-                            temp_board[move[0]][0] = 0
-                            temp_board[move[0]][3] = rook
-                            rook.row, rook.col = move[0], 3
-                    # Check if the king is still in check after the move
-                    if not is_in_check(temp_board, color):
-                        return False
+    bb = board.bb
+    occ = board.occ
+    king_bb = bb[color * 6 + KING]
+    king_sq = king_bb.bit_length() - 1
+
+    # King moves
+    if next(legal_moves(board, board[king_sq]), None):
+        return False
+
+    # Find the pieces giving check
+    opp = 6 - 6 * color
+    rook_checkers = rook_attacks(king_sq, occ) & (bb[opp + ROOK] | bb[opp + QUEEN])
+    bishop_checkers = bishop_attacks(king_sq, occ) & (bb[opp + BISHOP] | bb[opp + QUEEN])
+    checkers = (PAWN_ATTACKS[color][king_sq] & bb[opp + PAWN] |
+                KNIGHT_ATTACKS[king_sq] & bb[opp + KNIGHT] |
+                rook_checkers | bishop_checkers)
+    if checkers & (checkers - 1):
+        return True  # Double check, only the king could have moved
+
+    # Capture the checker or interpose between it and the king
+    checker_sq = checkers.bit_length() - 1
+    targets = checkers
+    if rook_checkers:
+        targets |= rook_attacks(king_sq, occ) & rook_attacks(checker_sq, occ)
+    elif bishop_checkers:
+        targets |= bishop_attacks(king_sq, occ) & bishop_attacks(checker_sq, occ)
+    elif en_passant_target:
+        # A checking pawn that just double-stepped can also be taken en passant
+        targets |= 1 << (en_passant_target[0] * 8 + en_passant_target[1])
+
+    # Try the pieces that attack the checker first, capturing it is the likeliest escape
+    own = 6 * color
+    defenders = board.occupancy(color) & ~king_bb
+    capturers = defenders & (PAWN_ATTACKS[color ^ 1][checker_sq] & bb[own + PAWN] |
+                             KNIGHT_ATTACKS[checker_sq] & bb[own + KNIGHT] |
+                             rook_attacks(checker_sq, occ) & (bb[own + ROOK] | bb[own + QUEEN]) |
+                             bishop_attacks(checker_sq, occ) & (bb[own + BISHOP] | bb[own + QUEEN]))
+    for group in (capturers, defenders & ~capturers):
+        for sq in squares(group):
+            if next(legal_moves(board, board[sq], targets, en_passant_target), None):
+                return False
     return True
 
 def promote_pawn(screen, piece):
@@ -840,52 +1098,50 @@ def promote_pawn(screen, piece):
     promotion = False
     choice = 'q'  # Default promotion to Queen
 
+    # Display promotion options
+    # Clear the promotion area
+    pygame.draw.rect(screen, LIGHT_GREY, (BOARD_SIZE + 10, HEIGHT//2 - 30, SIDEBAR_WIDTH - 20, 60))
+    screen.blit(LBL_PROMOTE, (BOARD_SIZE + 20, HEIGHT//2 - 30))
+    pygame.display.flip()
+
+    # Only key presses matter until a piece is chosen, so keep mouse events
+    # out of the queue and sleep until something else arrives
+    pygame.event.set_blocked(MOUSE_EVENTS)
     while not promotion:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_q:
-                    choice = 'q'
-                    promotion = True
-                elif event.key == pygame.K_r:
-                    choice = 'r'
-                    promotion = True
-                elif event.key == pygame.K_b:
-                    choice = 'b'
-                    promotion = True
-                elif event.key == pygame.K_n:
-                    choice = 'n'
-                    promotion = True
-
-        # Display promotion options
-        font = pygame.font.SysFont('Arial', 30)
-        text = font.render("Promote to (Q/R/B/N): ", True, BLACK_TEXT)
-        # Clear the promotion area
-        pygame.draw.rect(screen, LIGHT_GREY, (BOARD_SIZE + 10, HEIGHT//2 - 30, SIDEBAR_WIDTH - 20, 60))
-        screen.blit(text, (BOARD_SIZE + 20, HEIGHT//2 - 30))
-        pygame.display.flip()
+        event = pygame.event.wait()
+        if event.type == pygame.QUIT:
+            pygame.quit()
+            sys.exit()
+        elif event.type == pygame.KEYDOWN and event.key in PROMOTE_KEYS:
+            choice = PROMOTE_KEYS[event.key]
+            promotion = True
+    pygame.event.set_allowed(MOUSE_EVENTS)
     
     return Piece(choice, piece.row, piece.col, piece.color)
 
-def move_puts_king_in_check(board, piece, move, color):
+def undo_move(board, record, move_history, captured_white, captured_black):
     """
-    Determine if making a move would put the player's king in check.
+    Take back a move from the undo stack, restoring the board in place and
+    trimming the history and captured lists back to their earlier length.
     
     :param board: Current state of the board
-    :param piece: Piece being moved
-    :param move: Tuple (row, col) indicating the move
-    :param color: 'w' or 'b'
-    :return: True if the move puts the king in check, False otherwise
+    :param record: Entry popped from the undo stack
+    :param move_history: List of move strings
+    :param captured_white: List of captured white pieces
+    :param captured_black: List of captured black pieces
+    :return: Tuple (turn, en_passant_target) from before the move
     """
-    temp_board = copy.deepcopy(board)
-    temp_piece = temp_board[piece.row][piece.col]
-    temp_board[piece.row][piece.col] = 0
-    captured_piece = temp_board[move[0]][move[1]]
-    temp_board[move[0]][move[1]] = temp_piece
-    temp_piece.row, temp_piece.col = move[0], move[1]
-    return is_in_check(temp_board, color)
+    (piece, undo_info, placed_piece, turn, en_passant_target,
+     history_len, white_len, black_len) = record
+    if placed_piece is not piece:
+        # Put the pawn back in place of the piece it was promoted to
+        board.remove_piece(placed_piece.row, placed_piece.col)
+        board.place_piece(piece)
+    unmake_move(board, piece, undo_info)
+    del move_history[history_len:]
+    del captured_white[white_len:]
+    del captured_black[black_len:]
+    return turn, en_passant_target
 
 def main():
     """
@@ -899,42 +1155,73 @@ def main():
     
     selected_piece = None
     valid_moves = []
-    turn = 'w'  # 'w' for White's turn, 'b' for Black's turn
+    turn = WHITE_SIDE  # WHITE_SIDE or BLACK_SIDE, whose turn it is
     game_over = False
     winner = None
     move_history = []
     captured_white = []
     captured_black = []
-    move_stack = []  # For undo functionality
+    move_stack = []  # For undo functionality, entries are taken back by undo_move()
     en_passant_target = None  # Square where en passant is possible
+    redraw = True  # Whether anything besides the Undo button's hover state changed
+    full_redraw = True  # Whether to redraw the whole window rather than only the squares that changed
+    drawn_bb = [0] * 12  # Piece bitboards as of the last redraw
+    drawn_highlights = 0  # Squares highlighted as of the last redraw
 
     while run:
         clock.tick(60)  # Limit to 60 FPS
-        draw_board(WIN)
-        undo_button_rect = draw_sidebar(WIN, turn, move_history, captured_white, captured_black, game_over, winner)
-
-        # Highlight selected piece and its valid moves
-        if selected_piece and not game_over:
-            # Highlight the selected square
-            s = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
-            s.fill((0, 0, 255, 100))  # Semi-transparent blue
-            WIN.blit(s, (selected_piece.col * SQUARE_SIZE, selected_piece.row * SQUARE_SIZE))
-            
-            # Highlight valid move squares
-            for move in valid_moves:
-                s = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
-                s.fill((0, 255, 0, 100))  # Semi-transparent green
-                WIN.blit(s, (move[1] * SQUARE_SIZE, move[0] * SQUARE_SIZE))
-
-        # Draw pieces
-        for row in board:
-            for piece in row:
-                if piece != 0:
-                    piece.draw(WIN)
-
-        pygame.display.flip()
-
-        for event in pygame.event.get():
+        events = pygame.event.get()
+        if not events and not redraw:
+            continue  # Nothing happened, the screen is already up to date
+
+        if redraw:
+            highlights = 0
+            if selected_piece and not game_over:
+                highlights = 1 << (selected_piece.row * COLS + selected_piece.col)
+                for move in valid_moves:
+                    highlights |= 1 << (move[0] * COLS + move[1])
+
+            # Squares whose piece or highlight changed since the last redraw
+            if full_redraw:
+                dirty = ALL_SQUARES
+                draw_board(WIN)
+            else:
+                dirty = highlights | drawn_highlights
+                for before, after in zip(drawn_bb, board.bb):
+                    dirty |= before ^ after
+                dirty_rects = draw_squares(WIN, dirty)
+            undo_button_rect = draw_sidebar(WIN, turn, move_history, captured_white, captured_black, game_over, winner)
+
+            # Highlight selected piece and its valid moves
+            if highlights:
+                # Highlight the selected square
+                WIN.blit(HIGHLIGHT_SELECTED, (selected_piece.col * SQUARE_SIZE, selected_piece.row * SQUARE_SIZE))
+                
+                # Highlight valid move squares
+                for move in valid_moves:
+                    WIN.blit(HIGHLIGHT_MOVE, (move[1] * SQUARE_SIZE, move[0] * SQUARE_SIZE))
+
+            # Draw pieces
+            draw_pieces(WIN, board, dirty)
+
+            if full_redraw:
+                pygame.display.flip()
+            else:
+                pygame.display.update(dirty_rects + [SIDEBAR_RECT])
+            drawn_bb = board.bb[:]
+            drawn_highlights = highlights
+            redraw = full_redraw = False
+        else:
+            # Only the button's hover highlight can have changed
+            undo_button_rect = draw_undo_button(WIN)
+            pygame.display.update(undo_button_rect)
+
+        for event in events:
+            if event.type in (pygame.MOUSEBUTTONDOWN, pygame.KEYDOWN, pygame.VIDEOEXPOSE):
+                redraw = True
+            if event.type == pygame.VIDEOEXPOSE:
+                full_redraw = True
+
             if event.type == pygame.QUIT:
                 run = False
 
@@ -946,8 +1233,7 @@ def main():
                 if undo_button_rect and undo_button_rect.collidepoint(mouse_pos):
                     # Undo action
                     if move_stack:
-                        previous_state = move_stack.pop()
-                        board, turn, en_passant_target, move_history, captured_white, captured_black = copy.deepcopy(previous_state)
+                        turn, en_passant_target = undo_move(board, move_stack.pop(), move_history, captured_white, captured_black)
                         selected_piece = None
                         valid_moves = []
                         game_over = False
@@ -957,88 +1243,61 @@ def main():
                 if selected_piece:
                     # Attempt to move the selected piece
                     if (row, col) in valid_moves:
-                        # Save current state for undo
-                        move_stack.append(copy.deepcopy((board, turn, en_passant_target, move_history.copy(), captured_white.copy(), captured_black.copy())))
-                        
-                        # Handle en passant capture
-                        if selected_piece.name == 'p' and (row, col) == en_passant_target:
-                            capture_row = selected_piece.row
-                            capture_col = col
-                            captured_piece = board[capture_row][capture_col]
-                            board[capture_row][capture_col] = 0
-                            if captured_piece.color == 'w':
-                                captured_white.append(captured_piece.name + 'p')
-                            else:
-                                captured_black.append(captured_piece.name + 'p')
-                        
-                        # Move the piece
-                        board[selected_piece.row][selected_piece.col] = 0
-                        captured_piece = board[row][col]
+                        # State for undo, from before the move
+                        moved_piece = selected_piece
+                        previous_state = (turn, en_passant_target, len(move_history), len(captured_white), len(captured_black))
+
+                        # Move the piece, taking en passant captures and the rook's half of castling with it
+                        undo_info = make_move(board, selected_piece, (row, col))
+                        captured_piece = undo_info[2]
                         if captured_piece != 0:
-                            if captured_piece.color == 'w':
+                            if captured_piece.color == WHITE_SIDE:
                                 captured_white.append(captured_piece.name + 'p')
                             else:
                                 captured_black.append(captured_piece.name + 'p')
-                        board[row][col] = selected_piece
-                        selected_piece.row, selected_piece.col = row, col
-                        selected_piece.has_moved = True
-
-                        # Handle castling
-                        if selected_piece.name == 'k' and abs(col - 4) == 2:
-                            # Kingside Castling
-                            if col - 4 == 2:
-                                rook = board[row][7]
-                                board[row][7] = 0
-                                board[row][5] = rook
-                                rook.row = row
-                                rook.col = 5
-                                rook.has_moved = True
-                            # Queenside Castling
-                            elif col - 4 == -2:
-                                rook = board[row][0]
-                                board[row][0] = 0
-                                board[row][3] = rook
-                                rook.row = row
-                                rook.col = 3
-                                rook.has_moved = True
 
                         # Handle pawn promotion
-                        if selected_piece.name == 'p' and (row == 0 or row == ROWS -1):
+                        if selected_piece.kind == PAWN and (row == 0 or row == ROWS -1):
+                            board.remove_piece(row, col)
                             selected_piece = promote_pawn(WIN, selected_piece)
-                            board[row][col] = selected_piece
+                            board.place_piece(selected_piece)
+
+                        # Save what undo needs to take the move back
+                        move_stack.append((moved_piece, undo_info, selected_piece) + previous_state)
                         
                         # Update en passant target
-                        if selected_piece.name == 'p' and abs(row - (selected_piece.row - (-1 if selected_piece.color == 'w' else 1))) == 2:
-                            en_passant_target = ((row + (selected_piece.row - (-1 if selected_piece.color == 'w' else 1))) //2, col)
+                        from_row, from_col = undo_info[0], undo_info[1]
+                        if moved_piece.kind == PAWN and from_row == PAWN_START_ROW[turn] and row == PAWN_DOUBLE_ROW[turn]:
+                            en_passant_target = ((from_row + row) >> 1, col)
                         else:
                             en_passant_target = None
 
                         # Update move history
                         move_number = len(move_history) //2 +1
-                        move_san = f"{move_number}. {'White' if turn == 'w' else 'Black'}: {selected_piece.name.upper()} from ({selected_piece.row}, {selected_piece.col}) to ({row}, {col})"
+                        move_san = f"{move_number}. {COLOR_NAMES[turn]}: {PIECE_LETTERS[selected_piece.kind]} from ({from_row}, {from_col}) to ({row}, {col})"
                         move_history.append(move_san)
                         
                         # Check for win condition
                         game_over, winner = check_win_condition(board)
                         if not game_over:
                             # Check if the opponent is in check
-                            opponent_color = 'b' if turn == 'w' else 'w'
+                            opponent_color = turn ^ 1
                             if is_in_check(board, opponent_color):
-                                in_check_text = f"{'White' if opponent_color == 'w' else 'Black'} is in Check!"
+                                in_check_text = f"{COLOR_NAMES[opponent_color]} is in Check!"
                                 move_history.append(in_check_text)
                             
                             # Check for checkmate
-                            if is_checkmate(board, opponent_color):
+                            if is_checkmate(board, opponent_color, en_passant_target):
                                 game_over = True
-                                winner = 'w' if opponent_color == 'b' else 'b'
-                                win_message = f"{'White' if winner == 'w' else 'Black'} wins by Checkmate!"
+                                winner = opponent_color ^ 1
+                                win_message = f"{COLOR_NAMES[winner]} wins by Checkmate!"
                                 move_history.append(win_message)
                             
                             # Switch turns
-                            turn = 'b' if turn == 'w' else 'w'
+                            turn ^= 1
                         else:
                             # Append win message to move history
-                            win_message = f"{'White' if winner == 'w' else 'Black'} wins by capturing the king!"
+                            win_message = f"{COLOR_NAMES[winner]} wins by capturing the king!"
                             move_history.append(win_message)
                         
                         selected_piece = None
@@ -1048,26 +1307,21 @@ def main():
                         if piece != 0 and piece.color == turn:
                             selected_piece = piece
                             # Recalculate valid moves ensuring king isn't in check after move
-                            valid_moves = [move for move in piece.get_valid_moves(board, en_passant_target) if not move_puts_king_in_check(board, piece, move, turn)]
+                            valid_moves = list(legal_moves(board, piece, en_passant_target=en_passant_target))
                         else:
                             selected_piece = None
                             valid_moves = []
                 else:
                     if piece != 0 and piece.color == turn:
-                        # Check if player is in check and must move the king or block the check
-                        if is_in_check(board, turn):
-                            # Only allow moves that get out of check
-                            valid_moves = [move for move in piece.get_valid_moves(board, en_passant_target) if not move_puts_king_in_check(board, piece, move, turn)]
-                        else:
-                            valid_moves = piece.get_valid_moves(board, en_passant_target)
+                        # Only allow moves that don't leave the king in check
+                        valid_moves = list(legal_moves(board, piece, en_passant_target=en_passant_target))
                         selected_piece = piece
 
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_u:
                     # Undo move
                     if move_stack:
-                        previous_state = move_stack.pop()
-                        board, turn, en_passant_target, move_history, captured_white, captured_black = copy.deepcopy(previous_state)
+                        turn, en_passant_target = undo_move(board, move_stack.pop(), move_history, captured_white, captured_black)
                         selected_piece = None
                         valid_moves = []
                         game_over = False
@@ -1082,52 +1336,10 @@ def main():
                     move_stack = []
                     selected_piece = None
                     valid_moves = []
-                    turn = 'w'
+                    turn = WHITE_SIDE
                     game_over = False
                     winner = None
                     en_passant_target = None
 
-def is_checkmate(board, color):
-    """
-    Determine if the player of the specified color is in checkmate.
-    
-    :param board: Current state of the board
-    :param color: 'w' or 'b'
-    :return: Boolean indicating if the player is in checkmate
-    """
-    if not is_in_check(board, color):
-        return False
-    # Get all valid moves for the player
-    for row in board:
-        for piece in row:
-            if piece != 0 and piece.color == color:
-                moves = piece.get_valid_moves(board)
-                for move in moves:
-                    # Make a temporary copy of the board and make the move
-                    temp_board = copy.deepcopy(board)
-                    temp_piece = temp_board[piece.row][piece.col]
-                    temp_board[piece.row][piece.col] = 0
-                    captured_piece = temp_board[move[0]][move[1]]
-                    temp_board[move[0]][move[1]] = temp_piece
-                    temp_piece.row, temp_piece.col = move[0], move[1]
-                    # Handle castling moves separately
-                    if piece.name == 'k' and abs(move[1] - 4) == 2:
-                        if move[1] - 4 == 2:
-                            # Kingside Castling
-                            rook = temp_board[move[0]][7]
-                            temp_board[move[0]][7] = 0
-                            temp_board[move[0]][5] = rook
-                            rook.row, rook.col = move[0], 5
-                        elif move[1] - 4 == -2:
-                            # Queenside Castling
-                            rook = temp_board[move[0]][0]
-                            temp_board[move[0]][0] = 0
-                            temp_board[move[0]][3] = rook
-                            rook.row, rook.col = move[0], 3
-                    # Check if the king is still in check after the move
-                    if not is_in_check(temp_board, color):
-                        return False
-    return True
-
 if __name__ == '__main__':
     main()